@@ -1,7 +1,21 @@
 import requests
+import atexit
+import bisect
+import hashlib
 import json
 import os
-from datetime import datetime, timezone, timedelta
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from enum import IntEnum
+from functools import lru_cache
+from operator import itemgetter
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ========= CONFIG =========
 
@@ -12,10 +26,21 @@ COINGECKO_GLOBAL = "https://api.coingecko.com/api/v3/global"
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+NOTIFY_ENABLED = bool(TELEGRAM_TOKEN and TELEGRAM_CHAT_ID)
+TELEGRAM_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage" if TELEGRAM_TOKEN else None
 
 STATE_FILE = "last_state.json"
 META_FILE = "meta_state.json"
 SNAPSHOT_FILE = "last_snapshot.json"
+CACHE_FILE = "http_cache.json"
+
+# Seconds a cached API response stays fresh (FNG only changes daily)
+CACHE_TTLS = {
+    FNG_API: 3600,
+    BINANCE_SPOT: 900,
+    BINANCE_FUTURES: 300,
+    COINGECKO_GLOBAL: 300,
+}
 
 FEAR_DEEP = 30
 FEAR_EUPHORIA = 75
@@ -31,6 +56,12 @@ VOLUME_NORMAL = 1.2
 
 GLITCH_DAYS = 4
 
+# Skip a run if the previous one finished less than this many seconds ago
+RUN_DEBOUNCE_SECONDS = 30
+
+# Daily candles to request: the longest lookback is get_volume_ratio (25 bars)
+KLINES_LIMIT = 25
+
 # Candle-confirm thresholds
 WICK_RATIO_CONFIRM = 0.55
 RANGE_SPIKE_MULT = 1.25
@@ -46,33 +77,132 @@ BIAS_BEAR_SCORE = 35
 BIAS_HYSTERESIS_RUNS = 2
 
 
+# ========= HTTP SESSION =========
+
+# One pooled keep-alive session for every API call (Binance, FNG, CoinGecko, Telegram).
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "market-radar/2.5"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,  # one pool per host: 5 hosts must fit without eviction
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+atexit.register(SESSION.close)
+
+
 # ========= HELPERS =========
 
 def utc_now():
     return datetime.now(timezone.utc)
 
 
-def safe_get_json(url, params=None, timeout=10):
+def safe_get(url, params=None, timeout=10, headers=None):
     try:
-        r = requests.get(url, params=params, timeout=timeout)
-        return r.json()
-    except Exception as e:
+        r = SESSION.get(url, params=params, timeout=timeout, headers=headers)
+        r.raise_for_status()
+        return r
+    except requests.RequestException as e:
         print(f"[WARN] Failed request {url}: {e}")
         return None
 
 
+def parse_json(r):
+    # rate-limit / gateway errors often come back as HTML: don't try to parse them
+    if "json" not in r.headers.get("Content-Type", ""):
+        print(f"[WARN] Non-JSON response from {r.url}")
+        return None
+    try:
+        # parse the raw bytes: skips requests' charset detection + str decode
+        return json.loads(r.content)
+    except ValueError as e:
+        print(f"[WARN] Failed request {r.url}: {e}")
+        return None
+
+
+def safe_get_json(url, params=None, timeout=10):
+    r = safe_get(url, params=params, timeout=timeout)
+    if r is None:
+        return None
+    return parse_json(r)
+
+
+_HTTP_CACHE = None
+_HTTP_CACHE_LOCK = threading.Lock()
+
+
+def cache_key(url, params=None):
+    raw = json.dumps([url, sorted((params or {}).items())])
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def cached_get(url, params=None, timeout=10):
+    """
+    safe_get_json with a per-endpoint TTL (CACHE_TTLS), persisted in CACHE_FILE
+    so frequent runs don't refetch data that can't have changed yet.
+    Expired entries are revalidated with ETag / Last-Modified when the API
+    sent them, so an unchanged payload comes back as an empty 304.
+    """
+    global _HTTP_CACHE
+
+    ttl = CACHE_TTLS.get(url)
+    if ttl is None:
+        return safe_get_json(url, params=params, timeout=timeout)
+
+    key = cache_key(url, params)
+    with _HTTP_CACHE_LOCK:
+        if _HTTP_CACHE is None:
+            _HTTP_CACHE = load_json_file(CACHE_FILE)
+        entry = _HTTP_CACHE.get(key)
+
+    if entry and time.time() - entry.get("t", 0) < ttl:
+        return entry["data"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    r = safe_get(url, params=params, timeout=timeout, headers=headers)
+    if r is None:
+        return None
+
+    if r.status_code == 304 and entry:
+        data = entry["data"]
+        etag = r.headers.get("ETag") or entry.get("etag")
+        last_modified = r.headers.get("Last-Modified") or entry.get("last_modified")
+    else:
+        data = parse_json(r)
+        if data is None:
+            return None
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+
+    fresh = {"t": time.time(), "data": data}
+    if etag:
+        fresh["etag"] = etag
+    if last_modified:
+        fresh["last_modified"] = last_modified
+
+    with _HTTP_CACHE_LOCK:
+        _HTTP_CACHE[key] = fresh
+        write_json_file(CACHE_FILE, _HTTP_CACHE)
+
+    return data
+
+
 # ========= DATA FETCH =========
 
 def get_fear_greed():
-    data = safe_get_json(FNG_API)
+    data = cached_get(FNG_API)
     if not data or "data" not in data:
         return 50
     return int(data["data"][0]["value"])
 
 
 def get_daily_klines(symbol="BTCUSDT"):
-    params = {"symbol": symbol, "interval": "1d", "limit": 60}
-    data = safe_get_json(BINANCE_SPOT, params=params)
+    params = {"symbol": symbol, "interval": "1d", "limit": KLINES_LIMIT}
+    data = cached_get(BINANCE_SPOT, params=params)
     if isinstance(data, list) and len(data) > 0 and isinstance(data[0], list):
         return data
     print(f"[WARN] Invalid kline data for {symbol}: {data}")
@@ -80,24 +210,18 @@ def get_daily_klines(symbol="BTCUSDT"):
 
 
 def get_funding_rate(symbol="BTCUSDT"):
-    data = safe_get_json(BINANCE_FUTURES, params={"symbol": symbol})
+    data = cached_get(BINANCE_FUTURES, params={"symbol": symbol})
     if not data:
         return 0.0
 
     if isinstance(data, dict) and "lastFundingRate" in data:
         try:
             return float(data["lastFundingRate"])
-        except:
+        except (ValueError, TypeError):
             return 0.0
 
-    if isinstance(data, list):
-        for item in data:
-            if item.get("symbol") == symbol:
-                try:
-                    return float(item.get("lastFundingRate", 0.0))
-                except:
-                    return 0.0
-
+    # a list means the symbol filter was ignored (all perpetuals returned)
+    print(f"[WARN] Unexpected funding payload for {symbol}: {type(data).__name__}")
     return 0.0
 
 
@@ -108,7 +232,7 @@ def get_coingecko_global():
     - total market cap change 24h (usd)
     - btc dominance (%)
     """
-    data = safe_get_json(COINGECKO_GLOBAL, timeout=12)
+    data = cached_get(COINGECKO_GLOBAL, timeout=12)
     if not data or "data" not in data:
         return {
             "mcap_change_24h_pct_usd": None,
@@ -127,43 +251,86 @@ def get_coingecko_global():
     }
 
 
+def fetch_market_data(symbol="BTCUSDT"):
+    """
+    FNG, funding and klines are independent, so fetch them in parallel on the
+    shared SESSION. CoinGecko is only queried once klines came back: a run
+    without Binance data is discarded anyway and shouldn't spend the
+    free-tier rate limit. cg is None in that case.
+    """
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        f_fear = pool.submit(get_fear_greed)
+        f_funding = pool.submit(get_funding_rate, symbol)
+        klines = get_daily_klines(symbol)
+        f_cg = pool.submit(get_coingecko_global) if klines else None
+        cg = f_cg.result() if f_cg else None
+        return f_fear.result(), f_funding.result(), klines, cg
+
+
 # ========= FEATURE ENGINE =========
 
-def get_trend(klines):
-    if not klines or len(klines) < 15:
-        return "RANGE"
+class Trend(IntEnum):
+    UP = 0
+    DOWN = 1
+    RANGE = 2
+
+
+class Regime(IntEnum):
+    BULL_MODE = 0
+    BEAR_MODE = 1
+    CHOP_MODE = 2
+
+
+# Kline OHLCV fields as float columns, parsed once per run
+Candles = namedtuple("Candles", "open high low close volume")
 
-    closes = [float(k[4]) for k in klines]
-    if closes[-1] > closes[-5] > closes[-10]:
-        return "UP"
-    if closes[-1] < closes[-5] < closes[-10]:
-        return "DOWN"
-    return "RANGE"
+
+def parse_klines(klines):
+    return Candles(*(list(map(float, map(itemgetter(i), klines))) for i in range(1, 6)))
+
+
+def get_trend(candles):
+    closes = candles.close
+    if len(closes) < 15:
+        return Trend.RANGE
+
+    # only three closes matter: now, 5 bars ago, 10 bars ago
+    last, mid, first = closes[-1], closes[-5], closes[-10]
+    if last > mid > first:
+        return Trend.UP
+    if last < mid < first:
+        return Trend.DOWN
+    return Trend.RANGE
 
 
 def get_regime(trend):
-    if trend == "UP":
-        return "BULL_MODE"
-    if trend == "DOWN":
-        return "BEAR_MODE"
-    return "CHOP_MODE"
+    if trend == Trend.UP:
+        return Regime.BULL_MODE
+    if trend == Trend.DOWN:
+        return Regime.BEAR_MODE
+    return Regime.CHOP_MODE
+
 
+def trailing_mean(xs, lookback=20):
+    """Mean of the `lookback` bars before the last one."""
+    return sum(xs[-(lookback + 1):-1]) / lookback
 
-def get_volume_ratio(klines):
-    if not klines or len(klines) < 25:
+
+def get_volume_ratio(candles, lookback=20):
+    vols = candles.volume
+    if len(vols) < 25:
         return 1.0
 
-    vols = [float(k[5]) for k in klines]
-    avg_20 = sum(vols[-21:-1]) / 20
-    if avg_20 <= 0:
+    avg_vol = trailing_mean(vols, lookback)
+    if avg_vol <= 0:
         return 1.0
-    return vols[-1] / avg_20
+    return vols[-1] / avg_vol
 
 
-def get_recent_change_pct(klines, days=5):
-    if not klines or len(klines) < days + 1:
+def get_recent_change_pct(candles, days=5):
+    closes = candles.close
+    if len(closes) < days + 1:
         return 0.0
-    closes = [float(k[4]) for k in klines]
     old = closes[-(days + 1)]
     new = closes[-1]
     if old == 0:
@@ -171,12 +338,7 @@ def get_recent_change_pct(klines, days=5):
     return ((new - old) / old) * 100
 
 
-def candle_metrics_from_kline(k):
-    o = float(k[1])
-    h = float(k[2])
-    l = float(k[3])
-    c = float(k[4])
-
+def candle_metrics(o, h, l, c):
     body = abs(c - o)
     rng = max(1e-9, (h - l))
     wick = rng - body
@@ -199,67 +361,145 @@ def candle_metrics_from_kline(k):
     }
 
 
-def get_range_multiplier(klines, lookback=20):
-    if not klines or len(klines) < lookback + 2:
+def get_range_multiplier(candles, lookback=20):
+    highs, lows = candles.high, candles.low
+    if len(highs) < lookback + 2:
         return 1.0
 
-    ranges = []
-    for k in klines[-(lookback + 1):-1]:
-        m = candle_metrics_from_kline(k)
-        ranges.append(m["range"])
+    ranges = [max(1e-9, h - l) for h, l in zip(highs[-(lookback + 1):], lows[-(lookback + 1):])]
 
-    avg_range = sum(ranges) / len(ranges)
-    last_range = candle_metrics_from_kline(klines[-1])["range"]
+    avg_range = trailing_mean(ranges, lookback)
     if avg_range <= 0:
         return 1.0
-    return last_range / avg_range
+    return ranges[-1] / avg_range
+
+
+Features = namedtuple("Features", "trend regime volume_ratio change_5d range_mult last_candle")
+
+
+def compute_features(klines):
+    """
+    All kline-derived features in one pass over a single parsed Candles.
+    """
+    candles = parse_klines(klines)
+    trend = get_trend(candles)
+
+    if klines:
+        last_candle = candle_metrics(candles.open[-1], candles.high[-1], candles.low[-1], candles.close[-1])
+    else:
+        last_candle = {"wick_ratio": 0.0, "green": False, "red": False, "range": 0, "body": 0}
+
+    return Features(
+        trend=trend,
+        regime=get_regime(trend),
+        volume_ratio=get_volume_ratio(candles),
+        change_5d=get_recent_change_pct(candles, days=5),
+        range_mult=get_range_multiplier(candles, lookback=20),
+        last_candle=last_candle,
+    )
 
 
 # ========= STORAGE =========
 
+# Parsed state files are kept in memory for the life of the process
+# (re-read only if the file's mtime moves); saves only mark them dirty
+# and flush_json_files writes them once at exit.
+_JSON_CACHE = {}
+_JSON_DIRTY = set()
+_JSON_RAW = {}  # bytes last read from / written to each path
+_JSON_MTIME = {}  # st_mtime_ns of each path when cached (None: no file)
+
+
+def file_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
 def load_json_file(path):
-    if os.path.exists(path):
-        try:
-            return json.load(open(path))
-        except:
-            return {}
-    return {}
+    if path in _JSON_DIRTY:
+        return _JSON_CACHE[path]
+
+    mtime = file_mtime_ns(path)
+    if path in _JSON_CACHE and _JSON_MTIME.get(path) == mtime:
+        return _JSON_CACHE[path]
+
+    # missing or unreadable file -> start from an empty state
+    try:
+        raw = Path(path).read_bytes()
+        data = json.loads(raw)
+    except (OSError, ValueError):
+        raw, data = None, {}
+
+    _JSON_RAW[path] = raw
+    _JSON_MTIME[path] = mtime
+    _JSON_CACHE[path] = data
+    return data
 
 
 def save_json_file(path, data):
-    json.dump(data, open(path, "w"))
+    _JSON_CACHE[path] = data
+    _JSON_DIRTY.add(path)
 
 
-def parse_dt(s):
-    try:
-        return datetime.fromisoformat(s)
-    except:
-        return None
+def write_json_file(path, data):
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    on_disk = file_mtime_ns(path)
+    if on_disk is not None and on_disk == _JSON_MTIME.get(path) and raw == _JSON_RAW.get(path):
+        # file untouched since we read/wrote these same bytes: only bump mtime
+        # (the run debounce reads it)
+        os.utime(path)
+    else:
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+        _JSON_RAW[path] = raw
+
+    _JSON_MTIME[path] = file_mtime_ns(path)
+
+
+def flush_json_files():
+    for path in list(_JSON_DIRTY):
+        write_json_file(path, _JSON_CACHE[path])
+    _JSON_DIRTY.clear()
+
+
+atexit.register(flush_json_files)
 
 
 # ========= GLITCH WINDOW (Hybrid) =========
 
-def glitch_watch_active(meta):
-    start = meta.get("glitch_start_utc")
+def migrate_glitch_start(meta):
+    """
+    Older meta files stored the window start as an ISO string
+    (glitch_start_utc); convert it once into the epoch expiry.
+    """
+    start = meta.pop("glitch_start_utc", None)
     if not start:
-        return False
-    dt = parse_dt(start)
-    if not dt:
-        return False
-    return utc_now() <= dt + timedelta(days=GLITCH_DAYS)
+        return
+
+    try:
+        started = datetime.fromisoformat(start).timestamp()
+    except (ValueError, TypeError):
+        return
+    meta["glitch_expiry_ts"] = started + GLITCH_DAYS * 86400
+
+
+def glitch_watch_active(meta):
+    return time.time() <= meta.get("glitch_expiry_ts", 0)
 
 
 def start_glitch_watch(meta, direction):
-    meta["glitch_start_utc"] = utc_now().isoformat()
+    meta["glitch_expiry_ts"] = time.time() + GLITCH_DAYS * 86400
     meta["glitch_direction"] = direction
-    return meta
 
 
 def stop_glitch(meta):
-    meta.pop("glitch_start_utc", None)
+    meta.pop("glitch_expiry_ts", None)
     meta.pop("glitch_direction", None)
     meta.pop("glitch_confirmed", None)
-    return meta
 
 
 def get_glitch_direction(meta):
@@ -269,21 +509,21 @@ def get_glitch_direction(meta):
 def confirm_glitch_if_needed(meta, regime, last_candle, range_mult):
     if not glitch_watch_active(meta):
         meta["glitch_confirmed"] = False
-        return meta
+        return
 
     direction = get_glitch_direction(meta)
     wick_ratio = last_candle.get("wick_ratio", 0.0)
 
     bear_confirm = (
         direction == "BEAR_GLITCH"
-        and regime in ["BEAR_MODE", "CHOP_MODE"]
+        and regime != Regime.BULL_MODE
         and last_candle.get("green", False)
         and wick_ratio >= WICK_RATIO_CONFIRM
     )
 
     bull_confirm = (
         direction == "BULL_GLITCH"
-        and regime == "BULL_MODE"
+        and regime == Regime.BULL_MODE
         and last_candle.get("red", False)
         and wick_ratio >= WICK_RATIO_CONFIRM
     )
@@ -293,8 +533,6 @@ def confirm_glitch_if_needed(meta, regime, last_candle, range_mult):
     else:
         meta["glitch_confirmed"] = False
 
-    return meta
-
 
 def glitch_confirmed(meta):
     return bool(meta.get("glitch_confirmed", False))
@@ -302,28 +540,25 @@ def glitch_confirmed(meta):
 
 # ========= SCORES =========
 
-def compute_confidence(trend, fear, funding, volume_ratio, retail_flag):
-    score = 0
+# Confidence point tables: bisect picks the bucket a reading falls in.
+CONF_TREND_POINTS = {Trend.UP: 25, Trend.RANGE: 10}
+CONF_VOLUME_BUCKETS = (VOLUME_PRESTART, VOLUME_START)     # strictly above each
+CONF_VOLUME_POINTS = (0, 10, 20)
+CONF_FUNDING_BUCKETS = (FUNDING_RETAIL, FUNDING_EUPHORIA)  # strictly below each
+CONF_FUNDING_POINTS = (20, 10, 0)
 
-    if trend == "UP":
-        score += 25
-    elif trend == "RANGE":
-        score += 10
+
+@lru_cache(maxsize=512)
+def compute_confidence(trend, fear, funding, volume_ratio, retail_flag):
+    score = CONF_TREND_POINTS.get(trend, 0)
 
     if FEAR_DEEP <= fear <= 55:
         score += 20
     else:
         score += 5
 
-    if volume_ratio > VOLUME_START:
-        score += 20
-    elif volume_ratio > VOLUME_PRESTART:
-        score += 10
-
-    if funding < FUNDING_RETAIL:
-        score += 20
-    elif funding < FUNDING_EUPHORIA:
-        score += 10
+    score += CONF_VOLUME_POINTS[bisect.bisect_left(CONF_VOLUME_BUCKETS, volume_ratio)]
+    score += CONF_FUNDING_POINTS[bisect.bisect_right(CONF_FUNDING_BUCKETS, funding)]
 
     if retail_flag:
         score -= 25
@@ -331,6 +566,7 @@ def compute_confidence(trend, fear, funding, volume_ratio, retail_flag):
     return max(0, min(score, 100))
 
 
+@lru_cache(maxsize=512)
 def compute_health(regime, fear, funding, capitulation_risk, retail_flag, absorption, glitch_conf, g_dir):
     score = 50
 
@@ -359,9 +595,9 @@ def compute_health(regime, fear, funding, capitulation_risk, retail_flag, absorp
     if fear < FEAR_DEEP:
         score -= 5
 
-    if regime == "BEAR_MODE" and not absorption:
+    if regime == Regime.BEAR_MODE and not absorption:
         score -= 7
-    elif regime == "BULL_MODE" and not retail_flag:
+    elif regime == Regime.BULL_MODE and not retail_flag:
         score += 5
 
     return max(0, min(score, 100))
@@ -369,12 +605,13 @@ def compute_health(regime, fear, funding, capitulation_risk, retail_flag, absorp
 
 # ========= BTC BIAS =========
 
+@lru_cache(maxsize=512)
 def compute_btc_bias_score(trend, fear, funding, volume_ratio, change_5d):
     score = 50
 
-    if trend == "UP":
+    if trend == Trend.UP:
         score += 20
-    elif trend == "DOWN":
+    elif trend == Trend.DOWN:
         score -= 20
 
     if 35 <= fear <= 65:
@@ -427,7 +664,7 @@ def update_bias_with_hysteresis(meta, prefix, next_bias):
     if next_bias == current_bias:
         meta[pending_key] = None
         meta[pending_count_key] = 0
-        return meta
+        return
 
     if pending != next_bias:
         meta[pending_key] = next_bias
@@ -440,8 +677,6 @@ def update_bias_with_hysteresis(meta, prefix, next_bias):
         meta[pending_key] = None
         meta[pending_count_key] = 0
 
-    return meta
-
 
 # ========= MARKET BIAS (CoinGecko Global) =========
 
@@ -480,59 +715,88 @@ def compute_market_bias_score(coingecko):
 
 # ========= INTERPRETATION =========
 
-def interpret_bias(btc_bias, mkt_bias):
-    if btc_bias == "BULLISH" and mkt_bias == "BULLISH":
-        return "FULL RISK-ON (broad market participation)"
-    if btc_bias == "BULLISH" and mkt_bias != "BULLISH":
-        return "BTC-LED RALLY (early cycle / defensive risk-on)"
-    if btc_bias != "BULLISH" and mkt_bias == "BULLISH":
-        return "ALT RISK-ON (speculative rotation risk)"
-    if btc_bias == "BEARISH" and mkt_bias == "BEARISH":
-        return "FULL RISK-OFF"
-    return "MIXED / UNCLEAR"
+# (btc_bias, mkt_bias) -> mode; every other combination is mixed
+BIAS_MODES = {
+    ("BULLISH", "BULLISH"): "FULL RISK-ON (broad market participation)",
+    ("BULLISH", "NEUTRAL"): "BTC-LED RALLY (early cycle / defensive risk-on)",
+    ("BULLISH", "BEARISH"): "BTC-LED RALLY (early cycle / defensive risk-on)",
+    ("NEUTRAL", "BULLISH"): "ALT RISK-ON (speculative rotation risk)",
+    ("BEARISH", "BULLISH"): "ALT RISK-ON (speculative rotation risk)",
+    ("BEARISH", "BEARISH"): "FULL RISK-OFF",
+}
 
 
-# ========= STATE ENGINE =========
+def interpret_bias(btc_bias, mkt_bias):
+    return BIAS_MODES.get((btc_bias, mkt_bias), "MIXED / UNCLEAR")
 
-def detect_market_state():
-    fear = get_fear_greed()
-    funding = get_funding_rate("BTCUSDT")
-    klines = get_daily_klines("BTCUSDT")
 
-    trend = get_trend(klines)
-    regime = get_regime(trend)
-    volume_ratio = get_volume_ratio(klines)
-    change_5d = get_recent_change_pct(klines, days=5)
+# ========= STATE ENGINE =========
 
-    meta = load_json_file(META_FILE)
+@dataclass(frozen=True, slots=True)
+class MarketResult:
+    state: str
+    regime: str
+    trend: str
+    confidence: int
+    health: int
+    fear: int
+    funding: float
+    volume_ratio: float
+    change_5d: float
+    glitch_watch: bool
+    glitch_confirmed: bool
+    glitch_direction: str
+    wick_ratio: float
+    range_mult: float
+
+    # Bias fields
+    btc_bias_score: int
+    btc_bias_instant: str
+    btc_bias_confirmed: str
+
+    mkt_bias_score: int
+    mkt_bias_instant: str
+    mkt_bias_confirmed: str
+
+    bias_mode: str
+
+    # CoinGecko snapshot
+    cg_mcap_change_24h: float
+    cg_btc_dominance: float
+
+
+def detect_market_state(meta):
+    """
+    One pass of the state engine. Glitch/bias memory is updated in `meta`;
+    persisting it is left to the caller along with the other state files.
+    Returns None (meta untouched) when Binance klines are unavailable.
+    """
+    fear, funding, klines, cg = fetch_market_data("BTCUSDT")
+    if not klines:
+        return None
 
-    # Coingecko global snapshot
-    cg = get_coingecko_global()
+    trend, regime, volume_ratio, change_5d, range_mult, last_candle = compute_features(klines)
 
-    # Candle metrics
-    last_candle = candle_metrics_from_kline(klines[-1]) if klines else {
-        "wick_ratio": 0.0, "green": False, "red": False, "range": 0, "body": 0
-    }
-    range_mult = get_range_multiplier(klines, lookback=20)
+    migrate_glitch_start(meta)
 
     retail_entry = (funding >= FUNDING_RETAIL and volume_ratio >= VOLUME_RETAIL)
 
     capitulation_risk = (
         fear < FEAR_DEEP
         and volume_ratio >= VOLUME_CAPITULATION
-        and trend in ["DOWN", "RANGE"]
+        and trend != Trend.UP
         and change_5d < -3.0
     )
 
     bear_lag_window = (
         fear < FEAR_DEEP
         and funding <= FUNDING_RETAIL
-        and trend in ["DOWN", "RANGE"]
+        and trend != Trend.UP
         and not capitulation_risk
     )
 
     bull_lag_window = (
-        regime == "BULL_MODE"
+        regime == Regime.BULL_MODE
         and funding < FUNDING_RETAIL
         and fear < FEAR_EUPHORIA
         and change_5d < 1.0
@@ -540,14 +804,14 @@ def detect_market_state():
 
     high_risk = capitulation_risk or bear_lag_window or bull_lag_window or retail_entry
     if high_risk and not glitch_watch_active(meta):
-        if regime == "BEAR_MODE" or bear_lag_window or capitulation_risk:
-            meta = start_glitch_watch(meta, "BEAR_GLITCH")
-        elif regime == "BULL_MODE":
-            meta = start_glitch_watch(meta, "BULL_GLITCH")
+        if regime == Regime.BEAR_MODE or bear_lag_window or capitulation_risk:
+            start_glitch_watch(meta, "BEAR_GLITCH")
+        elif regime == Regime.BULL_MODE:
+            start_glitch_watch(meta, "BULL_GLITCH")
         else:
-            meta = start_glitch_watch(meta, "BEAR_GLITCH")
+            start_glitch_watch(meta, "BEAR_GLITCH")
 
-    meta = confirm_glitch_if_needed(meta, regime, last_candle, range_mult)
+    confirm_glitch_if_needed(meta, regime, last_candle, range_mult)
 
     prev_capitulation = meta.get("capitulation_recent", False)
     if capitulation_risk:
@@ -557,12 +821,12 @@ def detect_market_state():
         prev_capitulation
         and volume_ratio <= VOLUME_NORMAL
         and funding < FUNDING_RETAIL
-        and trend in ["RANGE", "UP"]
+        and trend != Trend.DOWN
     )
 
     if absorption:
         meta["capitulation_recent"] = False
-        meta = stop_glitch(meta)
+        stop_glitch(meta)
 
     # ---------- BIAS MODES ----------
     btc_bias_score = compute_btc_bias_score(trend, fear, funding, volume_ratio, change_5d)
@@ -571,7 +835,7 @@ def detect_market_state():
     btc_bias_instant = bias_from_score(btc_bias_score)
 
     # confirmed bias (hysteresis)
-    meta = update_bias_with_hysteresis(meta, "btc", btc_bias_instant)
+    update_bias_with_hysteresis(meta, "btc", btc_bias_instant)
     btc_bias_confirmed = meta.get("btc_bias", "NEUTRAL")
 
     mkt_bias_score = compute_market_bias_score(cg)
@@ -580,13 +844,11 @@ def detect_market_state():
     mkt_bias_instant = bias_from_score(mkt_bias_score)
 
     # confirmed bias (hysteresis)
-    meta = update_bias_with_hysteresis(meta, "mkt", mkt_bias_instant)
+    update_bias_with_hysteresis(meta, "mkt", mkt_bias_instant)
     mkt_bias_confirmed = meta.get("mkt_bias", "NEUTRAL")
 
     bias_mode = interpret_bias(btc_bias_confirmed, mkt_bias_confirmed)
 
-    save_json_file(META_FILE, meta)
-
     g_watch = glitch_watch_active(meta)
     g_conf = glitch_confirmed(meta)
     g_dir = get_glitch_direction(meta)
@@ -595,176 +857,207 @@ def detect_market_state():
     health = compute_health(regime, fear, funding, capitulation_risk, retail_entry, absorption, g_conf, g_dir)
 
     # ---------- STATE ----------
-    if capitulation_risk:
-        state = "CAPITULATION_RISK"
-    elif absorption:
-        state = "ABSORPTION_DETECTED"
-    elif g_watch and g_conf:
-        state = "GLITCH_WINDOW_ACTIVE"
-    elif bear_lag_window or bull_lag_window:
-        state = "LAG_WINDOW_ACTIVE"
-    elif fear < FEAR_DEEP and funding <= 0:
-        state = "DEEP_FEAR"
-    elif retail_entry:
-        state = "LIQUIDITY_TRAP"
-    elif trend == "UP" and volume_ratio > VOLUME_START and funding < FUNDING_RETAIL:
-        state = "START_CONFIRMED"
-    elif trend == "UP" and volume_ratio > VOLUME_PRESTART:
-        state = "PRE_START"
-    elif fear > FEAR_EUPHORIA and funding >= FUNDING_EUPHORIA:
-        state = "EUPHORIA"
-    else:
-        state = "NEUTRAL"
-
-    return {
-        "state": state,
-        "regime": regime,
-        "trend": trend,
-        "confidence": confidence,
-        "health": health,
-        "fear": fear,
-        "funding": funding,
-        "volume_ratio": volume_ratio,
-        "change_5d": change_5d,
-        "glitch_watch": g_watch,
-        "glitch_confirmed": g_conf,
-        "glitch_direction": g_dir,
-        "wick_ratio": last_candle.get("wick_ratio", 0.0),
-        "range_mult": range_mult,
+    # ordered by priority: the first rule that holds picks the state
+    rules = (
+        (capitulation_risk, "CAPITULATION_RISK"),
+        (absorption, "ABSORPTION_DETECTED"),
+        (g_watch and g_conf, "GLITCH_WINDOW_ACTIVE"),
+        (bear_lag_window or bull_lag_window, "LAG_WINDOW_ACTIVE"),
+        (fear < FEAR_DEEP and funding <= 0, "DEEP_FEAR"),
+        (retail_entry, "LIQUIDITY_TRAP"),
+        (trend == Trend.UP and volume_ratio > VOLUME_START and funding < FUNDING_RETAIL, "START_CONFIRMED"),
+        (trend == Trend.UP and volume_ratio > VOLUME_PRESTART, "PRE_START"),
+        (fear > FEAR_EUPHORIA and funding >= FUNDING_EUPHORIA, "EUPHORIA"),
+    )
+    state = next((name for flag, name in rules if flag), "NEUTRAL")
+
+    return MarketResult(
+        state=state,
+        regime=regime.name,
+        trend=trend.name,
+        confidence=confidence,
+        health=health,
+        fear=fear,
+        funding=funding,
+        volume_ratio=volume_ratio,
+        change_5d=change_5d,
+        glitch_watch=g_watch,
+        glitch_confirmed=g_conf,
+        glitch_direction=g_dir,
+        wick_ratio=last_candle.get("wick_ratio", 0.0),
+        range_mult=range_mult,
 
         # Bias fields
-        "btc_bias_score": btc_bias_score,
-        "btc_bias_instant": btc_bias_instant,
-        "btc_bias_confirmed": btc_bias_confirmed,
+        btc_bias_score=btc_bias_score,
+        btc_bias_instant=btc_bias_instant,
+        btc_bias_confirmed=btc_bias_confirmed,
 
-        "mkt_bias_score": mkt_bias_score,
-        "mkt_bias_instant": mkt_bias_instant,
-        "mkt_bias_confirmed": mkt_bias_confirmed,
+        mkt_bias_score=mkt_bias_score,
+        mkt_bias_instant=mkt_bias_instant,
+        mkt_bias_confirmed=mkt_bias_confirmed,
 
-        "bias_mode": bias_mode,
+        bias_mode=bias_mode,
 
         # CoinGecko snapshot
-        "cg_mcap_change_24h": cg.get("mcap_change_24h_pct_usd", None),
-        "cg_btc_dominance": cg.get("btc_dominance_pct", None),
-    }
+        cg_mcap_change_24h=cg.get("mcap_change_24h_pct_usd", None),
+        cg_btc_dominance=cg.get("btc_dominance_pct", None),
+    )
 
 
 # ========= TELEGRAM =========
 
 def send_telegram(message):
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+    if not NOTIFY_ENABLED:
         print("[WARN] Telegram secrets missing. Skipping notify.")
         return
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
     try:
-        requests.post(url, json=payload, timeout=10)
+        SESSION.post(TELEGRAM_URL, json=payload, timeout=10)
     except Exception as e:
         print(f"[WARN] Telegram send failed: {e}")
 
 
+# Single background worker so main can persist state while the message is in flight.
+_TG_POOL = ThreadPoolExecutor(max_workers=1)
+atexit.register(_TG_POOL.shutdown, wait=True)
+
+
+def send_telegram_async(message):
+    return _TG_POOL.submit(send_telegram, message)
+
+
 # ========= ALERT ENGINE =========
 
 def should_notify(current, last):
     if not last:
         return True
 
-    if last.get("state") != current.get("state"):
+    # daily heartbeat (UTC) -- the most common trigger, so check it first
+    today = utc_now().date().isoformat()
+    if last.get("heartbeat_day") != today:
         return True
 
-    if last.get("regime") != current.get("regime"):
+    if last.get("state") != current.state:
         return True
 
-    if last.get("glitch_confirmed") != current.get("glitch_confirmed"):
+    if last.get("regime") != current.regime:
         return True
 
-    if abs(last.get("confidence", 0) - current.get("confidence", 0)) >= CONFIDENCE_DELTA_ALERT:
+    if last.get("glitch_confirmed") != current.glitch_confirmed:
         return True
 
-    if abs(last.get("health", 0) - current.get("health", 0)) >= HEALTH_DELTA_ALERT:
+    if abs(last.get("confidence", 0) - current.confidence) >= CONFIDENCE_DELTA_ALERT:
         return True
 
-    if abs(last.get("btc_bias_score", 0) - current.get("btc_bias_score", 0)) >= BIAS_SCORE_DELTA_ALERT:
+    if abs(last.get("health", 0) - current.health) >= HEALTH_DELTA_ALERT:
         return True
 
-    if abs(last.get("mkt_bias_score", 0) - current.get("mkt_bias_score", 0)) >= BIAS_SCORE_DELTA_ALERT:
+    if abs(last.get("btc_bias_score", 0) - current.btc_bias_score) >= BIAS_SCORE_DELTA_ALERT:
         return True
 
-    # daily heartbeat (UTC)
-    today = utc_now().date().isoformat()
-    if last.get("heartbeat_day") != today:
+    if abs(last.get("mkt_bias_score", 0) - current.mkt_bias_score) >= BIAS_SCORE_DELTA_ALERT:
         return True
 
     return False
 
 
+ACTION_MAP = {
+    "CAPITULATION_RISK": "Bloodbath risk. NO leverage. Wait.",
+    "ABSORPTION_DETECTED": "Absorption detected. Begin real spot accumulation.",
+    "GLITCH_WINDOW_ACTIVE": "Glitch active. Trade TIME not price.",
+    "LAG_WINDOW_ACTIVE": "Lag window active. Patience. Avoid over-risk.",
+    "DEEP_FEAR": "Accumulate slowly. x2 max (spot preferred).",
+    "PRE_START": "Accumulate. No aggression.",
+    "START_CONFIRMED": "Hold/add on pullbacks. x3 allowed.",
+    "LIQUIDITY_TRAP": "DO NOTHING. Crowded zone. Expect pullback.",
+    "EUPHORIA": "Scale out. Protect capital.",
+    "NEUTRAL": "Stand by."
+}
+
+GLITCH_LINES = {
+    "BEAR_GLITCH": "⚠️ GLITCH CONFIRMED (BEAR): Ignore pumps. No chasing.",
+    "BULL_GLITCH": "⚠️ GLITCH CONFIRMED (BULL): Ignore dumps. Stop-hunt risk.",
+}
+GLITCH_LINE_DEFAULT = "⚠️ GLITCH CONFIRMED: Lag/whipsaw zone."
+GLITCH_WATCH_LINE = "🟡 Glitch WATCH: timer active, candle not confirmed yet."
+
+_MSG_TMPL = (
+    "{tag} (V2.5)\n\n"
+    "State: {state}\n"
+    "Regime: {regime}\n"
+    "Trend: {trend}\n"
+    "5D Change: {change_5d:.2f}%\n\n"
+    "Confidence: {confidence}/100\n"
+    "Health: {health}/100\n"
+    "Action: {action}\n\n"
+    "BTC Bias (Instant): {btc_bias_instant} ({btc_bias_score:.0f}/100)\n"
+    "BTC Bias (Confirmed): {btc_bias_confirmed}\n\n"
+    "Market Bias (Instant): {mkt_bias_instant} ({mkt_bias_score:.0f}/100)\n"
+    "Market Bias (Confirmed): {mkt_bias_confirmed}\n"
+    "Bias Mode: {bias_mode}\n"
+    "{cg_line}\n\n"
+    "Fear & Greed: {fear}\n"
+    "Funding: {funding:.4f}\n"
+    "Volume Ratio: {volume_ratio:.2f}\n"
+    "Wick Ratio: {wick_ratio:.2f}\n"
+    "Range Mult: {range_mult:.2f}\n\n"
+    "{glitch_line}\n\n"
+    "Time: {time}"
+)
+
+
 def build_message(r, is_heartbeat=False):
     glitch_line = ""
-    if r["glitch_watch"]:
-        if r["glitch_confirmed"]:
-            if r["glitch_direction"] == "BEAR_GLITCH":
-                glitch_line = "⚠️ GLITCH CONFIRMED (BEAR): Ignore pumps. No chasing."
-            elif r["glitch_direction"] == "BULL_GLITCH":
-                glitch_line = "⚠️ GLITCH CONFIRMED (BULL): Ignore dumps. Stop-hunt risk."
-            else:
-                glitch_line = "⚠️ GLITCH CONFIRMED: Lag/whipsaw zone."
+    if r.glitch_watch:
+        if r.glitch_confirmed:
+            glitch_line = GLITCH_LINES.get(r.glitch_direction, GLITCH_LINE_DEFAULT)
         else:
-            glitch_line = "🟡 Glitch WATCH: timer active, candle not confirmed yet."
-
-    action_map = {
-        "CAPITULATION_RISK": "Bloodbath risk. NO leverage. Wait.",
-        "ABSORPTION_DETECTED": "Absorption detected. Begin real spot accumulation.",
-        "GLITCH_WINDOW_ACTIVE": "Glitch active. Trade TIME not price.",
-        "LAG_WINDOW_ACTIVE": "Lag window active. Patience. Avoid over-risk.",
-        "DEEP_FEAR": "Accumulate slowly. x2 max (spot preferred).",
-        "PRE_START": "Accumulate. No aggression.",
-        "START_CONFIRMED": "Hold/add on pullbacks. x3 allowed.",
-        "LIQUIDITY_TRAP": "DO NOTHING. Crowded zone. Expect pullback.",
-        "EUPHORIA": "Scale out. Protect capital.",
-        "NEUTRAL": "Stand by."
-    }
+            glitch_line = GLITCH_WATCH_LINE
 
     tag = "✅ HEARTBEAT" if is_heartbeat else "📡 UPDATE"
 
     # CoinGecko formatting
     cg_line = "Global MCap(24h): N/A | BTC Dom: N/A"
-    if isinstance(r.get("cg_mcap_change_24h"), (int, float)) or isinstance(r.get("cg_btc_dominance"), (int, float)):
-        mcap = r.get("cg_mcap_change_24h")
-        dom = r.get("cg_btc_dominance")
+    if isinstance(r.cg_mcap_change_24h, (int, float)) or isinstance(r.cg_btc_dominance, (int, float)):
+        mcap = r.cg_mcap_change_24h
+        dom = r.cg_btc_dominance
         mcap_s = f"{mcap:.2f}%" if isinstance(mcap, (int, float)) else "N/A"
         dom_s = f"{dom:.2f}%" if isinstance(dom, (int, float)) else "N/A"
         cg_line = f"Global MCap(24h): {mcap_s} | BTC Dom: {dom_s}"
 
-    return (
-        f"{tag} (V2.5)\n\n"
-        f"State: {r['state']}\n"
-        f"Regime: {r['regime']}\n"
-        f"Trend: {r['trend']}\n"
-        f"5D Change: {r['change_5d']:.2f}%\n\n"
-        f"Confidence: {r['confidence']}/100\n"
-        f"Health: {r['health']}/100\n"
-        f"Action: {action_map.get(r['state'], 'Stand by.')}\n\n"
-        f"BTC Bias (Instant): {r['btc_bias_instant']} ({r['btc_bias_score']:.0f}/100)\n"
-        f"BTC Bias (Confirmed): {r['btc_bias_confirmed']}\n\n"
-        f"Market Bias (Instant): {r['mkt_bias_instant']} ({r['mkt_bias_score']:.0f}/100)\n"
-        f"Market Bias (Confirmed): {r['mkt_bias_confirmed']}\n"
-        f"Bias Mode: {r['bias_mode']}\n"
-        f"{cg_line}\n\n"
-        f"Fear & Greed: {r['fear']}\n"
-        f"Funding: {r['funding']:.4f}\n"
-        f"Volume Ratio: {r['volume_ratio']:.2f}\n"
-        f"Wick Ratio: {r['wick_ratio']:.2f}\n"
-        f"Range Mult: {r['range_mult']:.2f}\n\n"
-        f"{glitch_line}\n\n"
-        f"Time: {utc_now().isoformat()}"
-    )
+    return _MSG_TMPL.format_map({
+        **asdict(r),
+        "tag": tag,
+        "action": ACTION_MAP.get(r.state, "Stand by."),
+        "cg_line": cg_line,
+        "glitch_line": glitch_line,
+        "time": utc_now().isoformat(),
+    })
 
 
 def main():
-    current = detect_market_state()
+    # rapid re-entry (retries, overlapping triggers): previous result is still fresh
+    try:
+        if time.time() - os.path.getmtime(STATE_FILE) < RUN_DEBOUNCE_SECONDS:
+            print("[WARN] Previous run just finished. Skipping run.")
+            return
+    except FileNotFoundError:
+        pass
+
     last = load_json_file(SNAPSHOT_FILE)
 
+    # nothing to alert with: only run once to seed the snapshot
+    if not NOTIFY_ENABLED and last:
+        print("[WARN] Telegram secrets missing. Skipping run.")
+        return
+
+    meta = load_json_file(META_FILE)
+    current = detect_market_state(meta)
+    if current is None:
+        print("[WARN] No Binance kline data. Skipping notify and state update.")
+        return
+
     notify = should_notify(current, last)
 
     today = utc_now().date().isoformat()
@@ -774,12 +1067,12 @@ def main():
 
     if notify:
         msg = build_message(current, is_heartbeat=is_heartbeat)
-        send_telegram(msg)
+        send_telegram_async(msg)
 
+    save_json_file(META_FILE, meta)
     # persist heartbeat day for daily keepalive
-    current["heartbeat_day"] = today
-    save_json_file(SNAPSHOT_FILE, current)
-    save_json_file(STATE_FILE, {"state": current["state"]})
+    save_json_file(SNAPSHOT_FILE, {**asdict(current), "heartbeat_day": today})
+    save_json_file(STATE_FILE, {"state": current.state})
 
 
 if __name__ == "__main__":